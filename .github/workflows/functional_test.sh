@@ -103,6 +103,11 @@ cp test.config error.config
 echo 'CONFIG_BUG=y' >> error.config
 coverage run -a --branch bin/kconfig-hardened-check -c error.config && exit 1
 
+echo ">>>>> one disabled config option multiple times <<<<<"
+cp test.config error.config
+echo '# CONFIG_COMPILE_TEST is not set' >> error.config
+coverage run -a --branch bin/kconfig-hardened-check -c error.config && exit 1
+
 echo ">>>>> invalid compiler versions <<<<<"
 cp test.config error.config
 sed '8 s/CONFIG_CLANG_VERSION=0/CONFIG_CLANG_VERSION=120000/' test.config > error.config
@@ -10,93 +10,101 @@ This module performs input/output.
 
 # pylint: disable=missing-function-docstring,line-too-long,invalid-name,too-many-branches,too-many-statements
 
-import gzip
+import io
 import sys
 from argparse import ArgumentParser
-from collections import OrderedDict
+from functools import lru_cache
 import re
-import json
 from .__about__ import __version__
 from .checks import add_kconfig_checks, add_cmdline_checks, normalize_cmdline_options, add_sysctl_checks
-from .engine import populate_with_data, perform_checks, override_expected_value
+from .engine import populate_with_data, perform_checks, override_expected_value, get_option_names
 
+_READ_BUFFER_SIZE = 128 * 1024
 
-def _open(file: str, *args, **kwargs):
-    open_method = open
-    if file.endswith(".gz"):
-        open_method = gzip.open
+_VER_PAT = re.compile("# Linux/.+ Kernel Configuration$")
+_SYSCTL_PAT = re.compile("[a-zA-Z0-9\._-]+ =.*$")
 
-    return open_method(file, *args, **kwargs)
 
+@lru_cache(maxsize=None)
+def _gzip_module():
+    # gzip is imported lazily, since only *.gz Kconfig files need it
+    try:
+        # isal provides a faster drop-in replacement for the gzip module
+        from isal import igzip as gzip # pylint: disable=import-outside-toplevel
+    except ImportError:
+        import gzip # pylint: disable=import-outside-toplevel
+    return gzip
 
-def detect_arch(fname, archs):
-    with _open(fname, 'rt', encoding='utf-8') as f:
-        arch_pattern = re.compile("CONFIG_[a-zA-Z0-9_]+=y$")
-        arch = None
-        for line in f.readlines():
-            if arch_pattern.match(line):
-                option, _ = line[7:].split('=', 1)
-                if option in archs:
-                    if arch is None:
-                        arch = option
-                    else:
-                        return None, 'detected more than one microarchitecture'
-        if arch is None:
-            return None, 'failed to detect microarchitecture'
-        return arch, 'OK'
 
+def _open(file: str, mode='r', **kwargs):
+    if not file.endswith(".gz"):
+        return open(file, mode, **kwargs)
+
+    # the default 8 KiB buffer is too small for reading compressed configs
+    f = io.BufferedReader(_gzip_module().open(file, 'rb'), buffer_size=_READ_BUFFER_SIZE)
+    if 'b' in mode:
+        return f
+    return io.TextIOWrapper(f, **kwargs)
+
+
+def scan_config_header(fname, archs):
+    arch = None
+    arch_msg = 'failed to detect microarchitecture'
+    kernel_version = None
+    ver_msg = 'no kernel version detected'
+    ver_found = False
+    gcc_version = None
+    clang_version = None
+    arch_set = frozenset(archs)
 
-def detect_kernel_version(fname):
+    # detect the microarchitecture, kernel version and compiler in one pass
     with _open(fname, 'rt', encoding='utf-8') as f:
-        ver_pattern = re.compile("# Linux/.+ Kernel Configuration$")
-        for line in f.readlines():
-            if ver_pattern.match(line):
-                line = line.strip()
+        for line in f:
+            if line.startswith('CONFIG_'):
+                if line.startswith('CONFIG_GCC_VERSION='):
+                    gcc_version = line[19:].rstrip()
+                elif line.startswith('CONFIG_CLANG_VERSION='):
+                    clang_version = line[21:].rstrip()
+                elif line.endswith('=y\n') or line.endswith('=y'):
+                    # the arch names are valid option names, so no regex is needed here
+                    option = line[7:].rstrip('\n')[:-2]
+                    if option in arch_set:
+                        if arch is None:
+                            arch = option
+                            arch_msg = 'OK'
+                        else:
+                            arch = None
+                            arch_msg = 'detected more than one microarchitecture'
+                            break
+            elif not ver_found and line.startswith('# Linux/') and _VER_PAT.match(line):
+                ver_found = True
                 parts = line.split()
                 ver_str = parts[2]
                 ver_numbers = ver_str.split('.')
                 if len(ver_numbers) < 3 or not ver_numbers[0].isdigit() or not ver_numbers[1].isdigit():
-                    msg = f'failed to parse the version "{ver_str}"'
-                    return None, msg
-                return (int(ver_numbers[0]), int(ver_numbers[1])), None
-        return None, 'no kernel version detected'
+                    ver_msg = f'failed to parse the version "{ver_str}"'
+                else:
+                    kernel_version = (int(ver_numbers[0]), int(ver_numbers[1]))
+                    ver_msg = None
 
+    if arch is None or kernel_version is None:
+        # the caller fails on these errors first, don't evaluate the compiler
+        return (arch, arch_msg), (kernel_version, ver_msg), (None, None)
 
-def detect_compiler(fname):
-    gcc_version = None
-    clang_version = None
-    with _open(fname, 'rt', encoding='utf-8') as f:
-        for line in f.readlines():
-            if line.startswith('CONFIG_GCC_VERSION='):
-                gcc_version = line[19:-1]
-            if line.startswith('CONFIG_CLANG_VERSION='):
-                clang_version = line[21:-1]
     if gcc_version is None or clang_version is None:
-        return None, 'no CONFIG_GCC_VERSION or CONFIG_CLANG_VERSION'
-    if gcc_version == '0' and clang_version != '0':
-        return 'CLANG ' + clang_version, 'OK'
-    if gcc_version != '0' and clang_version == '0':
-        return 'GCC ' + gcc_version, 'OK'
-    sys.exit(f'[!] ERROR: invalid GCC_VERSION and CLANG_VERSION: {gcc_version} {clang_version}')
+        compiler = None, 'no CONFIG_GCC_VERSION or CONFIG_CLANG_VERSION'
+    elif gcc_version == '0' and clang_version != '0':
+        compiler = 'CLANG ' + clang_version, 'OK'
+    elif gcc_version != '0' and clang_version == '0':
+        compiler = 'GCC ' + gcc_version, 'OK'
+    else:
+        sys.exit(f'[!] ERROR: invalid GCC_VERSION and CLANG_VERSION: {gcc_version} {clang_version}')
+
+    return (arch, arch_msg), (kernel_version, ver_msg), compiler
 
 
 def print_unknown_options(checklist, parsed_options):
-    known_options = []
-
-    for o1 in checklist:
-        if o1.type != 'complex':
-            known_options.append(o1.name)
-            continue
-        for o2 in o1.opts:
-            if o2.type != 'complex':
-                if hasattr(o2, 'name'):
-                    known_options.append(o2.name)
-                continue
-            for o3 in o2.opts:
-                assert(o3.type != 'complex'), \
-                       f'unexpected ComplexOptCheck inside {o2.name}'
-                if hasattr(o3, 'name'):
-                    known_options.append(o3.name)
+    known_options = get_option_names(checklist)
 
     for option, value in parsed_options.items():
         if option not in known_options:
@@ -105,77 +113,99 @@ def print_unknown_options(checklist, parsed_options):
 
 def print_checklist(mode, checklist, with_results):
     if mode == 'json':
+        import json # pylint: disable=import-outside-toplevel
         output = []
         for opt in checklist:
             output.append(opt.json_dump(with_results))
-        print(json.dumps(output))
+        json.dump(output, sys.stdout)
+        sys.stdout.write('\n')
         return
 
+    write = sys.stdout.write
+
     # table header
     sep_line_len = 91
     if with_results:
         sep_line_len += 30
-    print('=' * sep_line_len)
-    print(f'{"option name":^40}|{"type":^7}|{"desired val":^12}|{"decision":^10}|{"reason":^18}', end='')
+    sep_line = '=' * sep_line_len
+    header = f'{"option name":^40}|{"type":^7}|{"desired val":^12}|{"decision":^10}|{"reason":^18}'
     if with_results:
-        print('| check result', end='')
-    print()
-    print('=' * sep_line_len)
+        header += '| check result'
+    write(f'{sep_line}\n{header}\n{sep_line}\n')
 
     # table contents
+    row_end = '\n'
+    if mode == 'verbose':
+        row_end += '-' * sep_line_len + '\n'
     for opt in checklist:
         if with_results:
+            result = opt.result
             if mode == 'show_ok':
-                if not opt.result.startswith('OK'):
+                if not result.startswith('OK'):
                     continue
-            if mode == 'show_fail':
-                if not opt.result.startswith('FAIL'):
+            elif mode == 'show_fail':
+                if not result.startswith('FAIL'):
                     continue
         opt.table_print(mode, with_results)
-        print()
-        if mode == 'verbose':
-            print('-' * sep_line_len)
-    print()
+        write(row_end)
+    write('\n')
 
     # final score
     if with_results:
-        fail_count = len(list(filter(lambda opt: opt.result.startswith('FAIL'), checklist)))
-        fail_suppressed = ''
-        ok_count = len(list(filter(lambda opt: opt.result.startswith('OK'), checklist)))
+        ok_count = 0
+        fail_count = 0
+        for opt in checklist:
+            result = opt.result
+            if result.startswith('OK'):
+                ok_count += 1
+            elif result.startswith('FAIL'):
+                fail_count += 1
         ok_suppressed = ''
+        fail_suppressed = ''
         if mode == 'show_ok':
             fail_suppressed = ' (suppressed in output)'
         if mode == 'show_fail':
             ok_suppressed = ' (suppressed in output)'
-        print(f'[+] Config check is finished: \'OK\' - {ok_count}{ok_suppressed} / \'FAIL\' - {fail_count}{fail_suppressed}')
+        write(f'[+] Config check is finished: \'OK\' - {ok_count}{ok_suppressed} / \'FAIL\' - {fail_count}{fail_suppressed}\n')
 
 
 def parse_kconfig_file(mode, parsed_options, fname):
+    # This is the hot loop for big Kconfig files, so the checks of the option
+    # name are inlined. They are equivalent to matching "CONFIG_[a-zA-Z0-9_]+".
+    warn = mode != 'json'
     with _open(fname, 'rt', encoding='utf-8') as f:
-        opt_is_on = re.compile("CONFIG_[a-zA-Z0-9_]+=.+$")
-        opt_is_off = re.compile("# CONFIG_[a-zA-Z0-9_]+ is not set$")
-
-        for line in f.readlines():
-            line = line.strip()
-            option = None
-            value = None
+        for line in f:
+            if not line.startswith(('CONFIG_', '#')):
+                line = line.strip()
+                if not line.startswith(('CONFIG_', '#')):
+                    if line != '' and warn:
+                        print(f'[!] WARNING: strange line in Kconfig file: "{line}"')
+                    continue
 
-            if opt_is_on.match(line):
-                option, value = line.split('=', 1)
+            if line.startswith('CONFIG_'):
+                line = line.rstrip()
+                option, _, value = line.partition('=')
+                if not value or len(option) <= 7 or not option.isascii() or not option.isidentifier():
+                    if warn:
+                        print(f'[!] WARNING: strange line in Kconfig file: "{line}"')
+                    continue
                 if value == 'is not set':
                     sys.exit(f'[!] ERROR: bad enabled Kconfig option "{line}"')
-            elif opt_is_off.match(line):
-                option, value = line[2:].split(' ', 1)
-                assert(value == 'is not set'), \
-                       f'unexpected value of disabled Kconfig option "{line}"'
-            elif line != '' and not line.startswith('#') and mode != 'json':
-                print(f'[!] WARNING: strange line in Kconfig file: "{line}"')
+            elif line.startswith('# CONFIG_'):
+                line = line.rstrip()
+                option = line[2:-11]
+                if not line.endswith(' is not set') or len(option) <= 7 or not option.isascii() or not option.isidentifier():
+                    continue
+                value = 'is not set'
+            else:
+                continue # skip the comments without stripping them
 
+            # Don't replace this check with a setdefault() identity test:
+            # values like 'is not set' and 'y' are shared string objects.
             if option in parsed_options:
                 sys.exit(f'[!] ERROR: Kconfig option "{line}" is found multiple times')
 
-            if option:
-                parsed_options[option] = value
+            parsed_options[option] = value
 
 
 def parse_cmdline_file(mode, parsed_options, fname):
@@ -201,10 +231,9 @@ def parse_cmdline_file(mode, parsed_options, fname):
 
 def parse_sysctl_file(mode, parsed_options, fname):
     with open(fname, 'r', encoding='utf-8') as f:
-        sysctl_pattern = re.compile("[a-zA-Z0-9\._-]+ =.*$")
-        for line in f.readlines():
+        for line in f:
             line = line.strip()
-            if not sysctl_pattern.match(line):
+            if not _SYSCTL_PAT.match(line):
                 sys.exit(f'[!] ERROR: unexpected line in sysctl file: {line}')
             option, value = line.split('=', 1)
             option = option.strip()
@@ -270,19 +299,18 @@ def main():
             if args.sysctl:
                 print(f'[+] Sysctl output file to check: {args.sysctl}')
 
-        arch, msg = detect_arch(args.config, supported_archs)
+        (arch, arch_msg), (kernel_version, ver_msg), (compiler, msg) = scan_config_header(args.config, supported_archs)
+
         if arch is None:
-            sys.exit(f'[!] ERROR: {msg}')
+            sys.exit(f'[!] ERROR: {arch_msg}')
         if mode != 'json':
             print(f'[+] Detected microarchitecture: {arch}')
 
-        kernel_version, msg = detect_kernel_version(args.config)
         if kernel_version is None:
-            sys.exit(f'[!] ERROR: {msg}')
+            sys.exit(f'[!] ERROR: {ver_msg}')
         if mode != 'json':
             print(f'[+] Detected kernel version: {kernel_version[0]}.{kernel_version[1]}')
 
-        compiler, msg = detect_compiler(args.config)
         if mode != 'json':
             if compiler:
                 print(f'[+] Detected compiler: {compiler}')
@@ -301,7 +329,7 @@ def main():
             add_sysctl_checks(config_checklist, arch)
 
         # populate the checklist with the parsed Kconfig data
-        parsed_kconfig_options = OrderedDict()
+        parsed_kconfig_options = {}
         parse_kconfig_file(mode, parsed_kconfig_options, args.config)
         populate_with_data(config_checklist, parsed_kconfig_options, 'kconfig')
 
@@ -310,13 +338,13 @@ def main():
 
         if args.cmdline:
             # populate the checklist with the parsed cmdline data
-            parsed_cmdline_options = OrderedDict()
+            parsed_cmdline_options = {}
             parse_cmdline_file(mode, parsed_cmdline_options, args.cmdline)
             populate_with_data(config_checklist, parsed_cmdline_options, 'cmdline')
 
         if args.sysctl:
             # populate the checklist with the parsed sysctl data
-            parsed_sysctl_options = OrderedDict()
+            parsed_sysctl_options = {}
             parse_sysctl_file(mode, parsed_sysctl_options, args.sysctl)
             populate_with_data(config_checklist, parsed_sysctl_options, 'sysctl')
 
@@ -366,14 +394,18 @@ def main():
             sys.exit(f'[!] ERROR: wrong mode "{mode}" for --generate')
         arch = args.generate
         add_kconfig_checks(config_checklist, arch)
-        print(f'CONFIG_{arch}=y') # the Kconfig fragment should describe the microarchitecture
+        lines = [f'CONFIG_{arch}=y'] # the Kconfig fragment should describe the microarchitecture
         for opt in config_checklist:
-            if opt.name == 'CONFIG_ARCH_MMAP_RND_BITS':
+            name = opt.name
+            if name == 'CONFIG_ARCH_MMAP_RND_BITS':
                 continue # don't add CONFIG_ARCH_MMAP_RND_BITS because its value needs refinement
-            if opt.expected == 'is not set':
-                print(f'# {opt.name} is not set')
+            expected = opt.expected
+            if expected == 'is not set':
+                lines.append(f'# {name} is not set')
             else:
-                print(f'{opt.name}={opt.expected}')
+                lines.append(f'{name}={expected}')
+        lines.append('')
+        sys.stdout.write('\n'.join(lines))
         sys.exit(0)
 
     parser.print_help()
@@ -86,6 +86,9 @@ class OptCheck:
             dump.append(self.result)
         return dump
 
+    def iter_names(self):
+        yield self.name
+
 
 class KconfigCheck(OptCheck):
     def __init__(self, *args, **kwargs):
@@ -139,6 +142,10 @@ class VersionCheck:
         if with_results:
             print(f'| {self.result}', end='')
 
+    def iter_names(self):
+        # VersionCheck has no name
+        yield from ()
+
 
 class ComplexOptCheck:
     def __init__(self, *opts):
@@ -183,6 +190,10 @@ class ComplexOptCheck:
             dump.append(self.result)
         return dump
 
+    def iter_names(self):
+        for o in self.opts:
+            yield from o.iter_names()
+
 
 class OR(ComplexOptCheck):
     # self.opts[0] is the option that this OR-check is about.
@@ -286,6 +297,10 @@ def populate_with_data(checklist, data, data_type):
         populate_opt_with_data(opt, data, data_type)
 
 
+def get_option_names(checklist):
+    return {name for opt in checklist for name in opt.iter_names()}
+
+
 def override_expected_value(checklist, name, new_val):
     for opt in checklist:
         if opt.name == name:
@@ -15,7 +15,7 @@ import io
 import sys
 from collections import OrderedDict
 import json
-from .engine import KconfigCheck, CmdlineCheck, SysctlCheck, VersionCheck, OR, AND, populate_with_data, perform_checks, override_expected_value
+from .engine import KconfigCheck, CmdlineCheck, SysctlCheck, VersionCheck, OR, AND, populate_with_data, perform_checks, override_expected_value, get_option_names
 
 
 class TestEngine(unittest.TestCase):
@@ -490,3 +490,21 @@ name_6                                  |sysctl | expected_6 |decision_6|     re
                  ["name_2", "cmdline", "expected_2_new", "decision_2", "reason_2", "OK"],
                  ["name_3", "sysctl", "expected_3_new", "decision_3", "reason_3", "OK"]]
         )
+
+    def test_option_names(self):
+        # 1. prepare the checklist
+        config_checklist = []
+        config_checklist += [KconfigCheck('reason_1', 'decision_1', 'NAME_1', 'expected_1')]
+        config_checklist += [CmdlineCheck('reason_2', 'decision_2', 'name_2', 'expected_2')]
+        config_checklist += [SysctlCheck('reason_3', 'decision_3', 'name_3', 'expected_3')]
+        config_checklist += [OR(KconfigCheck('reason_4', 'decision_4', 'NAME_4', 'expected_4'),
+                                VersionCheck((41, 101)))]
+        config_checklist += [AND(KconfigCheck('reason_5', 'decision_5', 'NAME_5', 'expected_5'),
+                                 OR(KconfigCheck('reason_6', 'decision_6', 'NAME_6', 'expected_6'),
+                                    KconfigCheck('reason_1', 'decision_1', 'NAME_1', 'expected_1')))]
+
+        # 2. check that the option names are correct
+        self.assertEqual(
+                get_option_names(config_checklist),
+                {'CONFIG_NAME_1', 'name_2', 'name_3', 'CONFIG_NAME_4', 'CONFIG_NAME_5', 'CONFIG_NAME_6'}
+        )